@@ -5,19 +5,42 @@ Script para extraer datos de tablas de los PDFs de precios de ganado
 
 import pdfplumber
 import pandas as pd
+import polars as pl
+import numpy as np
 import re
 import os
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 from pathlib import Path
-import json
+import orjson
 import glob
 
 
+# Patrones precompilados: se usan en bucles calientes, una celda/página a la vez
+_DATE_FILENAME_RE = re.compile(
+    r'(?:Del|del)?\s*(\d{1,2})-(\d{1,2})-(\d{2,4})\s*(?:al|a|-)?\s*(\d{1,2})-(\d{1,2})-(\d{2,4})')
+_DATE_TEXT_RES = [
+    re.compile(r'(?:Del|del)\s+(\d{1,2})\s*[-/]\s*(\d{1,2})\s*[-/]\s*(\d{2,4})\s+(?:al|a)\s+(\d{1,2})\s*[-/]\s*(\d{1,2})\s*[-/]\s*(\d{2,4})', re.IGNORECASE),
+    re.compile(r'(\d{1,2})\s*[-/]\s*(\d{1,2})\s*[-/]\s*(\d{2,4})\s+(?:al|a|-)\s+(\d{1,2})\s*[-/]\s*(\d{1,2})\s*[-/]\s*(\d{2,4})', re.IGNORECASE),
+    re.compile(r'Semana.*?(\d{1,2})\s*[-/]\s*(\d{1,2})\s*[-/]\s*(\d{2,4})', re.IGNORECASE),
+]
+_PRICE_STRIP_RE = re.compile(r'[B/.\s,]')
+_PRICE_NUM_RE = re.compile(r'(\d+(?:\.\d+)?)')
+
+_RECORD_COLUMNS = ['fecha_desde', 'fecha_hasta', 'lugar', 'categoria',
+                   'precio', 'fuente_pdf', 'tipo_tabla']
+
+
+# Los PDFs de subastaganadera.com traen tablas con líneas dibujadas: detectar
+# por regletas es mucho más rápido que inferirlas de las posiciones del texto
+_TABLE_SETTINGS = {'vertical_strategy': 'lines', 'horizontal_strategy': 'lines'}
+
+
 class PDFDataExtractor:
     def __init__(self, pdf_dir="pdfs", output_dir="data"):
         self.pdf_dir = pdf_dir
         self.output_dir = output_dir
-        self.extracted_data = []
+        self.extracted_data = pd.DataFrame()
         self.errors = []
 
         os.makedirs(self.output_dir, exist_ok=True)
@@ -25,8 +48,7 @@ class PDFDataExtractor:
     def extract_date_from_filename(self, filename):
         """Extrae fechas del nombre del archivo"""
         # Patrón: Del DD-MM-YY al DD-MM-YY
-        pattern = r'(?:Del|del)?\s*(\d{1,2})-(\d{1,2})-(\d{2,4})\s*(?:al|a|-)?\s*(\d{1,2})-(\d{1,2})-(\d{2,4})'
-        match = re.search(pattern, filename)
+        match = _DATE_FILENAME_RE.search(filename)
 
         if match:
             day1, month1, year1, day2, month2, year2 = match.groups()
@@ -48,14 +70,8 @@ class PDFDataExtractor:
 
     def extract_date_from_text(self, text):
         """Extrae fechas del texto del PDF"""
-        patterns = [
-            r'(?:Del|del)\s+(\d{1,2})\s*[-/]\s*(\d{1,2})\s*[-/]\s*(\d{2,4})\s+(?:al|a)\s+(\d{1,2})\s*[-/]\s*(\d{1,2})\s*[-/]\s*(\d{2,4})',
-            r'(\d{1,2})\s*[-/]\s*(\d{1,2})\s*[-/]\s*(\d{2,4})\s+(?:al|a|-)\s+(\d{1,2})\s*[-/]\s*(\d{1,2})\s*[-/]\s*(\d{2,4})',
-            r'Semana.*?(\d{1,2})\s*[-/]\s*(\d{1,2})\s*[-/]\s*(\d{2,4})',
-        ]
-
-        for pattern in patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
+        for pattern in _DATE_TEXT_RES:
+            match = pattern.search(text)
             if match:
                 groups = match.groups()
                 if len(groups) >= 6:
@@ -88,10 +104,10 @@ class PDFDataExtractor:
         price_str = str(price_str)
 
         # Eliminar símbolos de moneda, espacios, comas
-        price_str = re.sub(r'[B/.\s,]', '', price_str)
+        price_str = _PRICE_STRIP_RE.sub('', price_str)
 
         # Extraer números
-        match = re.search(r'(\d+(?:\.\d+)?)', price_str)
+        match = _PRICE_NUM_RE.search(price_str)
         if match:
             try:
                 return float(match.group(1))
@@ -100,6 +116,20 @@ class PDFDataExtractor:
 
         return None
 
+    def clean_price_series(self, valores):
+        """Versión vectorizada de clean_price sobre una columna completa
+
+        El regex corre una sola vez a nivel C sobre el buffer UTF-8 de
+        Polars en lugar de una llamada Python por celda.
+        """
+        limpio = (
+            pl.Series('precio', valores.astype(str))
+            .str.replace_all(r'[B/.\s,]', '')
+            .str.extract(r'(\d+(?:\.\d+)?)', 1)
+            .cast(pl.Float64, strict=False)
+        )
+        return limpio.to_pandas()
+
     def identify_table_type(self, df):
         """Identifica el tipo de tabla basándose en sus columnas"""
         if df.empty:
@@ -131,24 +161,26 @@ class PDFDataExtractor:
 
         try:
             with pdfplumber.open(pdf_path) as pdf:
-                # Extraer texto completo para buscar fechas
-                full_text = ""
-                for page in pdf.pages:
-                    full_text += page.extract_text() or ""
-
-                # Intentar extraer fechas del texto
-                date_from, date_to = self.extract_date_from_text(full_text)
+                # Intentar primero el nombre del archivo: es gratis y evita
+                # el extract_text() página por página (lo más lento de pdfplumber)
+                filename = os.path.basename(pdf_path)
+                date_from, date_to = self.extract_date_from_filename(filename)
 
-                # Si no se encontró en el texto, buscar en el nombre del archivo
+                # Solo si el nombre no trae fechas, extraer el texto completo
                 if not date_from:
-                    filename = os.path.basename(pdf_path)
-                    date_from, date_to = self.extract_date_from_filename(filename)
+                    full_text = "\n".join(page.extract_text() or "" for page in pdf.pages)
+                    date_from, date_to = self.extract_date_from_text(full_text)
 
-                # Extraer tablas de cada página
+                # Extraer tablas de cada página: find_tables localiza los
+                # candidatos sin materializar celdas, así las páginas sin
+                # tablas se saltan baratas
                 for page_num, page in enumerate(pdf.pages, 1):
-                    tables = page.extract_tables()
+                    candidates = page.find_tables(table_settings=_TABLE_SETTINGS)
+                    if not candidates:
+                        continue
 
-                    for table_num, table in enumerate(tables, 1):
+                    for table_num, candidate in enumerate(candidates, 1):
+                        table = candidate.extract()
                         if not table or len(table) < 2:
                             continue
 
@@ -184,8 +216,8 @@ class PDFDataExtractor:
         return tables_data
 
     def normalize_data(self, tables_data):
-        """Normaliza los datos extraídos a un formato estándar"""
-        normalized = []
+        """Normaliza los datos extraídos a un único DataFrame estándar"""
+        frames = []
 
         for item in tables_data:
             df = item['data']
@@ -193,102 +225,134 @@ class PDFDataExtractor:
 
             # Intentar diferentes estrategias según el tipo de tabla
             if table_type == "por_lugar":
-                normalized.extend(self._normalize_por_lugar(item, df))
+                frames.append(self._normalize_por_lugar(item, df))
             elif table_type == "por_categoria":
-                normalized.extend(self._normalize_por_categoria(item, df))
+                frames.append(self._normalize_por_categoria(item, df))
             else:
-                normalized.extend(self._normalize_general(item, df))
+                frames.append(self._normalize_general(item, df))
+
+        if not frames:
+            return pd.DataFrame(columns=_RECORD_COLUMNS)
+
+        # Un solo concat columnar: pandas arma cada Serie de una vez, sin
+        # inferir tipos dict por dict como con la lista de registros
+        normalized = pd.concat(frames, ignore_index=True)
+        for col in ('fecha_desde', 'fecha_hasta'):
+            normalized[col] = pd.to_datetime(normalized[col], cache=True)
 
         return normalized
 
+    def _celdas_con_precio(self, df, precios):
+        """Despivotea las columnas de precios limpias a formato largo
+
+        Devuelve (filas, columnas, valores) de las celdas con precio válido,
+        en el mismo orden fila-a-fila del recorrido anterior, sin iterar
+        celda por celda en Python.
+        """
+        sel = sorted(precios)
+        if not sel:
+            vacio = np.array([], dtype=int)
+            return vacio, vacio, np.array([])
+
+        matriz = np.column_stack([precios[j].to_numpy() for j in sel])
+        mask = ~np.isnan(matriz) & (matriz != 0)
+        filas, cols = np.nonzero(mask)
+        return filas, np.asarray(sel)[cols], matriz[filas, cols]
+
     def _normalize_por_lugar(self, item, df):
         """Normaliza tablas organizadas por lugar"""
-        records = []
-
-        for idx, row in df.iterrows():
-            # Buscar columna de lugar
-            lugar = None
-            for col in df.columns:
-                val = str(row[col])
-                if any(kw in str(col).lower() for kw in ['lugar', 'feria', 'mercado']):
-                    lugar = val
-                    break
-
-            if not lugar:
-                lugar = str(row.iloc[0])
-
-            # Buscar columnas de precios
-            for col in df.columns:
-                if any(kw in str(col).lower() for kw in ['precio', 'valor', 'b/', '$']):
-                    precio = self.clean_price(row[col])
-                    if precio:
-                        records.append({
-                            'fecha_desde': item['date_from'],
-                            'fecha_hasta': item['date_to'],
-                            'lugar': lugar.strip(),
-                            'categoria': str(col),
-                            'precio': precio,
-                            'fuente_pdf': item['pdf_filename'],
-                            'tipo_tabla': item['table_type']
-                        })
+        # Limpiar columnas de precios de forma vectorizada (una pasada por columna)
+        precios = {j: self.clean_price_series(df.iloc[:, j])
+                   for j, col in enumerate(df.columns)
+                   if any(kw in str(col).lower() for kw in ['precio', 'valor', 'b/', '$'])}
+
+        # Columna de lugar: la primera cuyo encabezado coincida, si no la primera
+        lugar_col = next((j for j, col in enumerate(df.columns)
+                          if any(kw in str(col).lower() for kw in ['lugar', 'feria', 'mercado'])),
+                         None)
+        if lugar_col is not None:
+            lugares = df.iloc[:, lugar_col].astype(str)
+            # Celdas vacías caen a la primera columna, como antes
+            lugares = lugares.where(lugares != '', df.iloc[:, 0].astype(str))
+        else:
+            lugares = df.iloc[:, 0].astype(str)
+        lugares = lugares.str.strip().to_numpy()
 
-        return records
+        filas, cols, valores = self._celdas_con_precio(df, precios)
+        col_names = np.array([str(col) for col in df.columns], dtype=object)
+
+        long = pd.DataFrame({
+            'fecha_desde': item['date_from'],
+            'fecha_hasta': item['date_to'],
+            'lugar': lugares[filas],
+            'categoria': col_names[cols],
+            'precio': valores,
+            'fuente_pdf': item['pdf_filename'],
+            'tipo_tabla': item['table_type'],
+        })
+
+        return long
 
     def _normalize_por_categoria(self, item, df):
         """Normaliza tablas organizadas por categoría"""
-        records = []
-
-        for idx, row in df.iterrows():
-            # Buscar columna de categoría
-            categoria = None
-            for col in df.columns:
-                val = str(row[col])
-                if any(kw in str(col).lower() for kw in ['categoría', 'categoria', 'tipo']):
-                    categoria = val
-                    break
-
-            if not categoria:
-                categoria = str(row.iloc[0])
-
-            # Buscar columnas de precios o lugares
-            for col in df.columns:
-                if col != df.columns[0]:  # Saltar primera columna (categoría)
-                    precio = self.clean_price(row[col])
-                    if precio:
-                        records.append({
-                            'fecha_desde': item['date_from'],
-                            'fecha_hasta': item['date_to'],
-                            'lugar': str(col) if 'precio' not in str(col).lower() else 'General',
-                            'categoria': categoria.strip(),
-                            'precio': precio,
-                            'fuente_pdf': item['pdf_filename'],
-                            'tipo_tabla': item['table_type']
-                        })
-
-        return records
+        # Limpiar columnas de precios de forma vectorizada (una pasada por columna)
+        precios = {j: self.clean_price_series(df.iloc[:, j])
+                   for j, col in enumerate(df.columns)
+                   if col != df.columns[0]}
+
+        # Columna de categoría: la primera cuyo encabezado coincida, si no la primera
+        cat_col = next((j for j, col in enumerate(df.columns)
+                        if any(kw in str(col).lower() for kw in ['categoría', 'categoria', 'tipo'])),
+                       None)
+        if cat_col is not None:
+            categorias = df.iloc[:, cat_col].astype(str)
+            # Celdas vacías caen a la primera columna, como antes
+            categorias = categorias.where(categorias != '', df.iloc[:, 0].astype(str))
+        else:
+            categorias = df.iloc[:, 0].astype(str)
+        categorias = categorias.str.strip().to_numpy()
+
+        filas, cols, valores = self._celdas_con_precio(df, precios)
+        # El encabezado es el lugar, salvo que sea una columna genérica de precio
+        col_lugares = np.array([str(col) if 'precio' not in str(col).lower() else 'General'
+                                for col in df.columns], dtype=object)
+
+        long = pd.DataFrame({
+            'fecha_desde': item['date_from'],
+            'fecha_hasta': item['date_to'],
+            'lugar': col_lugares[cols],
+            'categoria': categorias[filas],
+            'precio': valores,
+            'fuente_pdf': item['pdf_filename'],
+            'tipo_tabla': item['table_type'],
+        })
+
+        return long
 
     def _normalize_general(self, item, df):
         """Normaliza tablas de formato general"""
-        records = []
+        # Limpiar columnas de precios de forma vectorizada (una pasada por columna)
+        precios = {j: self.clean_price_series(df.iloc[:, j])
+                   for j in range(1, df.shape[1])}
 
         # Estrategia: primera columna = categoría/lugar, otras columnas = precios
-        for idx, row in df.iterrows():
-            identifier = str(row.iloc[0]).strip()
-
-            for col_idx, col in enumerate(df.columns[1:], 1):
-                precio = self.clean_price(row.iloc[col_idx])
-                if precio:
-                    records.append({
-                        'fecha_desde': item['date_from'],
-                        'fecha_hasta': item['date_to'],
-                        'lugar': identifier if 'lugar' in str(df.columns[0]).lower() else str(col),
-                        'categoria': identifier if 'categ' in str(df.columns[0]).lower() else str(col),
-                        'precio': precio,
-                        'fuente_pdf': item['pdf_filename'],
-                        'tipo_tabla': item['table_type']
-                    })
-
-        return records
+        identificadores = df.iloc[:, 0].astype(str).str.strip().to_numpy() if df.shape[1] else np.array([])
+        col_names = np.array([str(col) for col in df.columns], dtype=object)
+        primera_col = str(df.columns[0]).lower() if df.shape[1] else ''
+
+        filas, cols, valores = self._celdas_con_precio(df, precios)
+
+        long = pd.DataFrame({
+            'fecha_desde': item['date_from'],
+            'fecha_hasta': item['date_to'],
+            'lugar': identificadores[filas] if 'lugar' in primera_col else col_names[cols],
+            'categoria': identificadores[filas] if 'categ' in primera_col else col_names[cols],
+            'precio': valores,
+            'fuente_pdf': item['pdf_filename'],
+            'tipo_tabla': item['table_type'],
+        })
+
+        return long
 
     def process_all_pdfs(self):
         """Procesa todos los PDFs en el directorio"""
@@ -300,12 +364,16 @@ class PDFDataExtractor:
 
         print(f"Procesando {len(pdf_files)} archivos PDF...\n")
 
+        # El parseo con pdfplumber es independiente por archivo: se reparte
+        # entre procesos para escalar con los núcleos disponibles
         all_tables = []
-        for i, pdf_path in enumerate(pdf_files, 1):
-            print(f"[{i}/{len(pdf_files)}] {os.path.basename(pdf_path)}")
-            tables = self.extract_tables_from_pdf(pdf_path)
-            print(f"  ✓ Extraídas {len(tables)} tablas")
-            all_tables.extend(tables)
+        with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+            resultados = executor.map(_extraer_tablas_worker, pdf_files, chunksize=4)
+            for i, (pdf_path, (tables, errores)) in enumerate(zip(pdf_files, resultados), 1):
+                print(f"[{i}/{len(pdf_files)}] {os.path.basename(pdf_path)}")
+                print(f"  ✓ Extraídas {len(tables)} tablas")
+                all_tables.extend(tables)
+                self.errors.extend(errores)
 
         print(f"\n{'='*60}")
         print(f"Extracción completada:")
@@ -323,11 +391,11 @@ class PDFDataExtractor:
 
     def save_to_csv(self, filename="precios_ganado.csv"):
         """Guarda los datos en formato CSV"""
-        if not self.extracted_data:
+        if self.extracted_data.empty:
             print("No hay datos para guardar")
             return
 
-        df = pd.DataFrame(self.extracted_data)
+        df = self.extracted_data
 
         # Ordenar por fecha
         df = df.sort_values('fecha_desde').reset_index(drop=True)
@@ -341,24 +409,73 @@ class PDFDataExtractor:
 
         return output_path
 
+    def save_to_parquet(self, filename="precios_ganado.parquet"):
+        """Guarda los datos en formato Parquet (columnar, tipado y comprimido)"""
+        if self.extracted_data.empty:
+            print("No hay datos para guardar")
+            return
+
+        df = self.extracted_data
+
+        # Ordenar por fecha
+        df = df.sort_values('fecha_desde').reset_index(drop=True)
+
+        output_path = os.path.join(self.output_dir, filename)
+
+        # Parquet conserva las fechas como tipo nativo: el análisis
+        # posterior ya no necesita re-parsear strings de fecha
+        pl.from_pandas(df).write_parquet(output_path, compression='zstd')
+
+        print(f"Datos guardados en: {output_path}")
+        print(f"  - Registros: {len(df)}")
+        print(f"  - Columnas: {list(df.columns)}")
+
+        return output_path
+
     def save_to_sqlite(self, db_name="precios_ganado.db"):
         """Guarda los datos en una base de datos SQLite"""
         import sqlite3
 
-        if not self.extracted_data:
+        if self.extracted_data.empty:
             print("No hay datos para guardar")
             return
 
-        df = pd.DataFrame(self.extracted_data)
-        df = df.sort_values('fecha_desde').reset_index(drop=True)
+        df = self.extracted_data.sort_values('fecha_desde').reset_index(drop=True)
 
         db_path = os.path.join(self.output_dir, db_name)
         conn = sqlite3.connect(db_path)
 
-        # Guardar en tabla principal
-        df.to_sql('precios_ganado', conn, if_exists='replace', index=False)
+        # Fechas como texto ISO (mismo formato que escribía to_sql)
+        df = df.copy()
+        for col in ('fecha_desde', 'fecha_hasta'):
+            fechas = pd.to_datetime(df[col]).dt.strftime('%Y-%m-%d %H:%M:%S')
+            df[col] = fechas.where(fechas.notna(), None)
+
+        # Carga masiva: journal en memoria y una sola transacción con
+        # executemany es bastante más rápido que el bind fila a fila de to_sql
+        conn.execute('PRAGMA journal_mode=MEMORY')
+        conn.execute('PRAGMA synchronous=OFF')
+        conn.execute('PRAGMA temp_store=MEMORY')
+
+        conn.execute('DROP TABLE IF EXISTS precios_ganado')
+        conn.execute('''
+            CREATE TABLE precios_ganado (
+                fecha_desde TEXT,
+                fecha_hasta TEXT,
+                lugar TEXT,
+                categoria TEXT,
+                precio REAL,
+                fuente_pdf TEXT,
+                tipo_tabla TEXT
+            )
+        ''')
+        conn.executemany(
+            'INSERT INTO precios_ganado VALUES (?, ?, ?, ?, ?, ?, ?)',
+            df.itertuples(index=False, name=None)
+        )
 
-        # Crear índices para búsquedas eficientes
+        # Crear índices al final: construir cada B-tree de una sola vez
+        # es más rápido que mantenerlo durante la inserción
         cursor = conn.cursor()
         cursor.execute('''
             CREATE INDEX IF NOT EXISTS idx_fecha_desde ON precios_ganado(fecha_desde)
@@ -383,10 +500,10 @@ class PDFDataExtractor:
 
     def generate_summary(self):
         """Genera un resumen de los datos extraídos"""
-        if not self.extracted_data:
+        if self.extracted_data.empty:
             return {}
 
-        df = pd.DataFrame(self.extracted_data)
+        df = self.extracted_data
 
         summary = {
             'total_registros': len(df),
@@ -401,10 +518,11 @@ class PDFDataExtractor:
             'categorias': sorted(df['categoria'].unique().tolist()) if 'categoria' in df.columns else [],
         }
 
-        # Guardar resumen
+        # Guardar resumen (orjson serializa a bytes directamente)
         summary_path = os.path.join(self.output_dir, 'resumen.json')
-        with open(summary_path, 'w', encoding='utf-8') as f:
-            json.dump(summary, f, ensure_ascii=False, indent=2, default=str)
+        with open(summary_path, 'wb') as f:
+            f.write(orjson.dumps(summary, default=str,
+                                 option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY))
 
         print(f"\nResumen de datos:")
         print(f"{'='*60}")
@@ -418,6 +536,16 @@ class PDFDataExtractor:
         return summary
 
 
+def _extraer_tablas_worker(pdf_path):
+    """Procesa un PDF en un proceso hijo; devuelve (tablas, errores)
+
+    Función a nivel de módulo para que sea picklable por ProcessPoolExecutor.
+    """
+    extractor = PDFDataExtractor()
+    tables = extractor.extract_tables_from_pdf(pdf_path)
+    return tables, extractor.errors
+
+
 def main():
     print("="*60)
     print("EXTRACTOR DE DATOS DE PDFs - PRECIOS DE GANADO")
@@ -455,8 +583,8 @@ def main():
     # Guardar errores si los hay
     if extractor.errors:
         errors_path = os.path.join(extractor.output_dir, 'errores.json')
-        with open(errors_path, 'w', encoding='utf-8') as f:
-            json.dump(extractor.errors, f, ensure_ascii=False, indent=2)
+        with open(errors_path, 'wb') as f:
+            f.write(orjson.dumps(extractor.errors, default=str, option=orjson.OPT_INDENT_2))
         print(f"\nErrores guardados en: {errors_path}")
 
     print("\n" + "="*60)
@@ -6,6 +6,7 @@ Script principal para ejecutar todo el pipeline de extracción y análisis
 import sys
 import os
 import subprocess
+import importlib.util
 
 def print_header(title):
     print("\n" + "="*70)
@@ -17,16 +18,21 @@ def check_dependencies():
     print_header("VERIFICANDO DEPENDENCIAS")
 
     required = [
-        'requests', 'beautifulsoup4', 'pdfplumber', 'pandas',
-        'plotly', 'jupyter', 'openpyxl'
+        'requests', 'beautifulsoup4', 'lxml', 'pdfplumber', 'pandas',
+        'plotly', 'jupyter', 'openpyxl', 'orjson'
     ]
 
+    # Nombre en PyPI -> nombre del módulo importable cuando difieren
+    import_names = {'beautifulsoup4': 'bs4'}
+
     missing = []
     for package in required:
-        try:
-            __import__(package.replace('-', '_'))
+        # find_spec solo resuelve el import sin ejecutar el módulo:
+        # importar pandas/plotly/jupyter de verdad cuesta varios segundos
+        name = import_names.get(package, package.replace('-', '_'))
+        if importlib.util.find_spec(name) is not None:
             print(f"✓ {package}")
-        except ImportError:
+        else:
             print(f"✗ {package} - NO INSTALADO")
             missing.append(package)
 
@@ -81,13 +87,15 @@ def run_extractor():
             print("✗ No se extrajeron tablas")
             return False
 
-        # Decidir formato según tamaño
+        # Parquet es el formato canónico del pipeline: más compacto y mucho
+        # más rápido de leer que CSV/SQLite, y conserva los tipos de datos
+        print(f"\nGuardando {len(extractor.extracted_data)} registros en Parquet...")
+        extractor.save_to_parquet()
+
+        # Mantener SQLite como formato secundario para datasets grandes
         if len(extractor.extracted_data) > 50000:
-            print(f"\nDataset grande ({len(extractor.extracted_data)} registros), usando SQLite...")
+            print(f"\nDataset grande ({len(extractor.extracted_data)} registros), guardando también en SQLite...")
             extractor.save_to_sqlite()
-        else:
-            print(f"\nDataset mediano ({len(extractor.extracted_data)} registros), usando CSV...")
-            extractor.save_to_csv()
 
         extractor.generate_summary()
 
@@ -5,13 +5,58 @@ desde https://subastaganadera.com/blog/
 """
 
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import asyncio
+import aiohttp
+import aiofiles
+from bs4 import BeautifulSoup, FeatureNotFound
 import os
 import re
-from urllib.parse import urljoin, urlparse
+import shutil
+from collections import deque
+from urllib.parse import urljoin, urlparse, urlsplit, urlunsplit, parse_qsl, urlencode
 import time
 from datetime import datetime
-import json
+import orjson
+
+# Descargas concurrentes: límite global para no sobrecargar el servidor
+MAX_DESCARGAS_CONCURRENTES = 10
+
+# Patrones precompilados: se evalúan por cada post de cada página rastreada
+_RE_POST = re.compile(r'post|entry|article')
+_RE_TITLE = re.compile(r'title|heading')
+_RE_DATE = re.compile(r'Del\s+(\d{1,2}-\d{1,2}-\d{2,4})\s+al\s+(\d{1,2}-\d{1,2}-\d{2,4})',
+                      re.IGNORECASE)
+_RE_PUBLISHED = re.compile(r'date|time|published')
+_RE_CATEGORIA = re.compile(r'categor|tag')
+_RE_PAGINACION_HREF = re.compile(r'page|paged|/\d+/?$')
+_RE_PAGINACION_URL = re.compile(r'/page/\d+|paged=\d+|\?pg=\d+')
+
+
+# Parámetros de seguimiento que no cambian el contenido de la página
+_PARAMS_RASTREO = ('utm_', 'fbclid', 'gclid')
+
+
+def _canonicalize(url):
+    """Normaliza una URL para deduplicar la frontera del rastreo: ordena los
+    parámetros de consulta, descarta los de seguimiento y unifica las
+    variantes con y sin barra final"""
+    partes = urlsplit(url)
+    query = urlencode(sorted(
+        (k, v) for k, v in parse_qsl(partes.query)
+        if not k.startswith(_PARAMS_RASTREO)
+    ))
+    path = partes.path.rstrip('/') or '/'
+    return urlunsplit((partes.scheme.lower(), partes.netloc.lower(), path, query, ''))
+
+
+def _sopa(html_content):
+    """Parsea HTML con lxml (parser en C); cae a html.parser si falta"""
+    try:
+        return BeautifulSoup(html_content, 'lxml')
+    except FeatureNotFound:
+        return BeautifulSoup(html_content, 'html.parser')
 
 class SubastaGanaderaScraper:
     def __init__(self, base_url="https://subastaganadera.com/blog/", output_dir="pdfs"):
@@ -21,28 +66,38 @@ class SubastaGanaderaScraper:
         self.session.headers.update({
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
         })
-        self.pdf_links = []
+
+        # Pool explícito con keep-alive: todas las peticiones van al mismo
+        # host, así se reusa la conexión TCP+TLS en lugar de rehacer el
+        # handshake; urllib3 maneja los reintentos con backoff
+        adapter = HTTPAdapter(
+            pool_connections=20,
+            pool_maxsize=20,
+            max_retries=Retry(total=3, backoff_factor=1,
+                              status_forcelist=[500, 502, 503, 504])
+        )
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        # set: deduplica sobre la marcha y evita el list(set(...)) final
+        self.pdf_links = set()
         self.metadata = []
 
         # Crear directorio de salida
         os.makedirs(self.output_dir, exist_ok=True)
 
-    def get_page_content(self, url, retries=3):
+    def get_page_content(self, url):
         """Obtiene el contenido HTML de una página"""
-        for attempt in range(retries):
-            try:
-                response = self.session.get(url, timeout=30)
-                response.raise_for_status()
-                return response.text
-            except Exception as e:
-                print(f"Error obteniendo {url} (intento {attempt + 1}/{retries}): {e}")
-                if attempt < retries - 1:
-                    time.sleep(2 ** attempt)
-        return None
-
-    def extract_pdf_links(self, html_content, page_url):
-        """Extrae todos los enlaces a PDFs de una página"""
-        soup = BeautifulSoup(html_content, 'html.parser')
+        # Los reintentos con backoff los maneja el Retry del adapter
+        try:
+            response = self.session.get(url, timeout=30)
+            response.raise_for_status()
+            return response.text
+        except Exception as e:
+            print(f"Error obteniendo {url}: {e}")
+            return None
+
+    def extract_pdf_links(self, soup, page_url):
+        """Extrae todos los enlaces a PDFs de una página ya parseada"""
         pdf_links = []
 
         # Buscar todos los enlaces
@@ -62,13 +117,12 @@ class SubastaGanaderaScraper:
 
         return pdf_links
 
-    def extract_metadata(self, html_content, page_url):
-        """Extrae metadata de la página (fecha, título, categorías)"""
-        soup = BeautifulSoup(html_content, 'html.parser')
+    def extract_metadata(self, soup, page_url):
+        """Extrae metadata de la página ya parseada (fecha, título, categorías)"""
         metadata = []
 
         # Buscar posts/artículos
-        articles = soup.find_all(['article', 'div'], class_=re.compile(r'post|entry|article'))
+        articles = soup.find_all(['article', 'div'], class_=_RE_POST)
 
         for article in articles:
             meta = {
@@ -80,24 +134,23 @@ class SubastaGanaderaScraper:
             }
 
             # Extraer título
-            title_elem = article.find(['h1', 'h2', 'h3', 'a'], class_=re.compile(r'title|heading'))
+            title_elem = article.find(['h1', 'h2', 'h3', 'a'], class_=_RE_TITLE)
             if title_elem:
                 meta['title'] = title_elem.get_text(strip=True)
 
             # Extraer fecha del título (formato: Del DD-MM-YY al DD-MM-YY)
-            date_match = re.search(r'Del\s+(\d{1,2}-\d{1,2}-\d{2,4})\s+al\s+(\d{1,2}-\d{1,2}-\d{2,4})',
-                                  meta['title'], re.IGNORECASE)
+            date_match = _RE_DATE.search(meta['title'])
             if date_match:
                 meta['date_from'] = date_match.group(1)
                 meta['date_to'] = date_match.group(2)
 
             # Extraer fecha de publicación
-            date_elem = article.find(['time', 'span'], class_=re.compile(r'date|time|published'))
+            date_elem = article.find(['time', 'span'], class_=_RE_PUBLISHED)
             if date_elem:
                 meta['published_date'] = date_elem.get_text(strip=True)
 
             # Extraer categorías
-            cat_elems = article.find_all(['a', 'span'], class_=re.compile(r'categor|tag'))
+            cat_elems = article.find_all(['a', 'span'], class_=_RE_CATEGORIA)
             meta['categories'] = [cat.get_text(strip=True) for cat in cat_elems]
 
             # Buscar PDFs dentro del artículo
@@ -110,13 +163,12 @@ class SubastaGanaderaScraper:
 
         return metadata
 
-    def get_pagination_links(self, html_content, base_url):
-        """Encuentra enlaces de paginación"""
-        soup = BeautifulSoup(html_content, 'html.parser')
+    def get_pagination_links(self, soup, base_url):
+        """Encuentra enlaces de paginación en una página ya parseada"""
         page_links = set()
 
         # Buscar enlaces de paginación
-        pagination = soup.find_all(['a', 'link'], href=re.compile(r'page|paged|/\d+/?$'))
+        pagination = soup.find_all(['a', 'link'], href=_RE_PAGINACION_HREF)
         for link in pagination:
             href = link.get('href')
             if href:
@@ -126,7 +178,7 @@ class SubastaGanaderaScraper:
         # También buscar patrones comunes de paginación
         for link in soup.find_all('a', href=True):
             href = link['href']
-            if re.search(r'/page/\d+|paged=\d+|\?pg=\d+', href):
+            if _RE_PAGINACION_URL.search(href):
                 full_url = urljoin(base_url, href)
                 page_links.add(full_url)
 
@@ -152,9 +204,11 @@ class SubastaGanaderaScraper:
             response = self.session.get(url, timeout=60, stream=True)
             response.raise_for_status()
 
+            # Copia en C con bloques de 1 MiB en lugar de ~128 iteraciones
+            # de Python por MB con iter_content
+            response.raw.decode_content = True
             with open(filepath, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    f.write(chunk)
+                shutil.copyfileobj(response.raw, f, length=1024 * 1024)
 
             print(f"  ✓ Descargado: {filename} ({os.path.getsize(filepath) / 1024:.1f} KB)")
             return filepath
@@ -166,19 +220,23 @@ class SubastaGanaderaScraper:
     def crawl_site(self, max_pages=100):
         """Rastrea el sitio completo buscando PDFs"""
         visited = set()
-        to_visit = [self.base_url]
+        to_visit = deque([self.base_url])
+        # URLs ya encoladas (en forma canónica): membresía O(1) y sin
+        # refetches de variantes equivalentes de la misma página
+        queued = {_canonicalize(self.base_url)}
 
         print(f"Iniciando rastreo desde: {self.base_url}\n")
 
         page_count = 0
         while to_visit and page_count < max_pages:
-            url = to_visit.pop(0)
+            url = to_visit.popleft()
 
-            if url in visited:
+            canonica = _canonicalize(url)
+            if canonica in visited:
                 continue
 
             print(f"[{page_count + 1}] Analizando: {url}")
-            visited.add(url)
+            visited.add(canonica)
             page_count += 1
 
             # Obtener contenido
@@ -186,31 +244,34 @@ class SubastaGanaderaScraper:
             if not html:
                 continue
 
+            # Parsear una sola vez y compartir el DOM con los tres extractores
+            soup = _sopa(html)
+
             # Extraer PDFs
-            pdf_links = self.extract_pdf_links(html, url)
+            pdf_links = self.extract_pdf_links(soup, url)
             if pdf_links:
                 print(f"  Encontrados {len(pdf_links)} PDFs")
-                self.pdf_links.extend(pdf_links)
+                self.pdf_links.update(pdf_links)
 
             # Extraer metadata
-            metadata = self.extract_metadata(html, url)
+            metadata = self.extract_metadata(soup, url)
             if metadata:
                 print(f"  Extraída metadata de {len(metadata)} posts")
                 self.metadata.extend(metadata)
 
             # Buscar más páginas (paginación)
-            pagination = self.get_pagination_links(html, url)
+            pagination = self.get_pagination_links(soup, url)
             for page_link in pagination:
-                if page_link not in visited and page_link not in to_visit:
+                link_canonico = _canonicalize(page_link)
+                if link_canonico not in visited and link_canonico not in queued:
                     # Solo seguir enlaces del mismo dominio
                     if urlparse(page_link).netloc == urlparse(self.base_url).netloc:
+                        queued.add(link_canonico)
                         to_visit.append(page_link)
 
             # Delay para no sobrecargar el servidor
             time.sleep(1)
 
-        # Eliminar duplicados
-        self.pdf_links = list(set(self.pdf_links))
         print(f"\n{'='*60}")
         print(f"Rastreo completado:")
         print(f"  - Páginas visitadas: {len(visited)}")
@@ -218,28 +279,75 @@ class SubastaGanaderaScraper:
         print(f"  - Posts con metadata: {len(self.metadata)}")
         print(f"{'='*60}\n")
 
+    async def _download_pdf_async(self, session, semaforo, url, idx):
+        """Descarga un PDF dentro del límite global de concurrencia"""
+        filename = os.path.basename(urlparse(url).path)
+        if not filename or not filename.endswith('.pdf'):
+            filename = f"documento_{idx}.pdf"
+
+        filepath = os.path.join(self.output_dir, filename)
+
+        # Evitar descargar si ya existe
+        if os.path.exists(filepath):
+            print(f"  Ya existe: {filename}")
+            return {'url': url, 'filepath': filepath, 'filename': filename}
+
+        async with semaforo:
+            try:
+                print(f"  Descargando: {filename}")
+                async with session.get(url, timeout=aiohttp.ClientTimeout(total=60)) as response:
+                    response.raise_for_status()
+                    async with aiofiles.open(filepath, 'wb') as f:
+                        async for chunk in response.content.iter_chunked(1024 * 1024):
+                            await f.write(chunk)
+
+                print(f"  ✓ Descargado: {filename} ({os.path.getsize(filepath) / 1024:.1f} KB)")
+                return {'url': url, 'filepath': filepath, 'filename': filename}
+
+            except Exception as e:
+                print(f"  ✗ Error descargando {url}: {e}")
+                return None
+
+    async def _download_all_async(self, urls):
+        """Lanza todas las descargas en paralelo y junta los resultados"""
+        semaforo = asyncio.Semaphore(MAX_DESCARGAS_CONCURRENTES)
+        connector = aiohttp.TCPConnector(limit=MAX_DESCARGAS_CONCURRENTES,
+                                         limit_per_host=MAX_DESCARGAS_CONCURRENTES)
+
+        async with aiohttp.ClientSession(connector=connector,
+                                         headers=dict(self.session.headers)) as session:
+            async with asyncio.TaskGroup() as tg:
+                tasks = [tg.create_task(self._download_pdf_async(session, semaforo, url, i))
+                         for i, url in enumerate(urls, 1)]
+
+        return [task.result() for task in tasks if task.result()]
+
     def download_all_pdfs(self):
-        """Descarga todos los PDFs encontrados"""
+        """Descarga todos los PDFs encontrados de forma concurrente"""
         if not self.pdf_links:
             print("No se encontraron PDFs para descargar")
             return
 
-        print(f"Descargando {len(self.pdf_links)} PDFs...\n")
+        # Filtrar antes de programar tareas: un PDF ya descargado no debe
+        # ocupar un hueco del semáforo ni una conexión solo para salir temprano
+        existentes = set(os.listdir(self.output_dir))
+        pendientes = [url for url in sorted(self.pdf_links)
+                      if os.path.basename(urlparse(url).path) not in existentes]
+        omitidos = len(self.pdf_links) - len(pendientes)
+        if omitidos:
+            print(f"Omitidos {omitidos} PDFs ya descargados")
+        if not pendientes:
+            print("Todos los PDFs ya están descargados")
+            return []
+
+        print(f"Descargando {len(pendientes)} PDFs...\n")
 
-        downloaded = []
-        for i, pdf_url in enumerate(self.pdf_links, 1):
-            print(f"[{i}/{len(self.pdf_links)}] {pdf_url}")
-            filepath = self.download_pdf(pdf_url)
-            if filepath:
-                downloaded.append({
-                    'url': pdf_url,
-                    'filepath': filepath,
-                    'filename': os.path.basename(filepath)
-                })
-            time.sleep(0.5)
+        # El handshake TCP+TLS y el RTT de cada archivo se solapan entre
+        # tareas; el semáforo reemplaza al antiguo sleep entre descargas
+        downloaded = asyncio.run(self._download_all_async(pendientes))
 
         print(f"\n{'='*60}")
-        print(f"Descarga completada: {len(downloaded)}/{len(self.pdf_links)} PDFs")
+        print(f"Descarga completada: {len(downloaded)}/{len(pendientes)} PDFs")
         print(f"{'='*60}\n")
 
         return downloaded
@@ -252,12 +360,14 @@ class SubastaGanaderaScraper:
             'scrape_date': datetime.now().isoformat(),
             'base_url': self.base_url,
             'total_pdfs': len(self.pdf_links),
-            'pdf_links': self.pdf_links,
+            'pdf_links': sorted(self.pdf_links),
             'posts_metadata': self.metadata
         }
 
-        with open(metadata_file, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        # orjson serializa varias veces más rápido que json y emite UTF-8
+        # directamente; default=str cubre fechas u otros tipos no nativos
+        with open(metadata_file, 'wb') as f:
+            f.write(orjson.dumps(data, default=str, option=orjson.OPT_INDENT_2))
 
         print(f"Metadata guardada en: {metadata_file}")
         return metadata_file
@@ -4,48 +4,97 @@ Utilidades para análisis de datos de precios de ganado
 """
 
 import pandas as pd
+import numpy as np
 import sqlite3
 import os
+from contextlib import closing
 from datetime import datetime, timedelta
 
+# Tipos compactos para la carga: 'category' reduce la memoria de las columnas
+# de texto repetitivo (lugar/categoria) y acelera los groupby posteriores,
+# float32 basta para precios en B/.
+_DTYPES = {'lugar': 'category', 'categoria': 'category', 'precio': 'float32'}
+
 
 def load_data(source='auto'):
     """
-    Carga datos desde CSV o SQLite
+    Carga datos desde Parquet, CSV o SQLite
 
     Args:
-        source: 'auto', 'csv', 'sqlite', o ruta específica
+        source: 'auto' (prefiere Parquet) o ruta específica
 
     Returns:
         DataFrame con los datos
     """
     if source == 'auto':
+        parquet_path = 'data/precios_ganado.parquet'
         db_path = 'data/precios_ganado.db'
         csv_path = 'data/precios_ganado.csv'
 
-        if os.path.exists(db_path):
+        if os.path.exists(parquet_path):
+            source = parquet_path
+        elif os.path.exists(db_path):
             source = db_path
         elif os.path.exists(csv_path):
             source = csv_path
         else:
             raise FileNotFoundError("No se encontró archivo de datos")
 
-    if source.endswith('.db') or source.endswith('.sqlite'):
-        conn = sqlite3.connect(source)
-        df = pd.read_sql_query("SELECT * FROM precios_ganado", conn)
-        conn.close()
+    if source.endswith('.parquet'):
+        # Parquet conserva los tipos: no hace falta reconvertir fechas
+        df = pd.read_parquet(source, dtype_backend='pyarrow')
+    elif source.endswith('.db') or source.endswith('.sqlite'):
+        # Leer por bloques: read_sql_query sin chunksize llega a retener
+        # varias veces el tamaño final del DataFrame durante la carga
+        with closing(sqlite3.connect(source)) as conn:
+            chunks = pd.read_sql_query("SELECT * FROM precios_ganado", conn,
+                                       chunksize=100_000,
+                                       dtype_backend='pyarrow',
+                                       parse_dates=['fecha_desde', 'fecha_hasta'])
+            df = pd.concat(list(chunks), ignore_index=True, copy=False)
     else:
-        df = pd.read_csv(source)
+        df = pd.read_csv(source, dtype=_DTYPES,
+                         parse_dates=['fecha_desde', 'fecha_hasta'],
+                         engine='pyarrow')
+
+    # El motor pyarrow deja como texto las fechas que no están en formato ISO
+    # (CSVs antiguos en dd/mm/aaaa); convertirlas solo en ese caso
+    for col in ('fecha_desde', 'fecha_hasta'):
+        if col in df.columns and not pd.api.types.is_datetime64_any_dtype(df[col]):
+            df[col] = pd.to_datetime(df[col], dayfirst=True, cache=True)
+
+    # Las rutas Parquet/SQLite entregan float64; float32 sobra para precios
+    # con dos decimales y mueve la mitad de bytes en cada operación
+    if 'precio' in df.columns:
+        df['precio'] = pd.to_numeric(df['precio'], downcast='float')
+
+    # Crear fecha promedio: punto medio calculado sobre las vistas int64 de
+    # ambas columnas (una sola suma vectorizada en lugar de reducir fila a
+    # fila); el desplazamiento >> 1 evita desbordar al sumar dos timestamps
+    a = df['fecha_desde'].to_numpy()
+    b = df['fecha_hasta'].to_numpy()
+    fecha = (a.view('i8') >> 1) + (b.view('i8') >> 1)
+    fecha[np.isnat(a) | np.isnat(b)] = np.iinfo('i8').min  # NaT
+    df['fecha'] = fecha.view(a.dtype)
+
+    return df
+
 
-    # Convertir fechas
-    if 'fecha_desde' in df.columns:
-        df['fecha_desde'] = pd.to_datetime(df['fecha_desde'])
-    if 'fecha_hasta' in df.columns:
-        df['fecha_hasta'] = pd.to_datetime(df['fecha_hasta'])
+def optimize_dtypes(df):
+    """
+    Reduce la memoria de un DataFrame bajando cada columna numérica al
+    dtype más pequeño que conserva sus valores
 
-    # Crear fecha promedio
-    df['fecha'] = df[['fecha_desde', 'fecha_hasta']].mean(axis=1)
+    Args:
+        df: DataFrame
 
+    Returns:
+        DataFrame con dtypes compactos (las demás columnas no cambian)
+    """
+    df = df.copy(deep=False)
+    for col in df.select_dtypes(include='number').columns:
+        downcast = 'integer' if pd.api.types.is_integer_dtype(df[col]) else 'float'
+        df[col] = pd.to_numeric(df[col], downcast=downcast)
     return df
 
 
@@ -58,18 +107,29 @@ def filter_by_date(df, start_date=None, end_date=None):
     return df
 
 
+def _isin_rapido(col, valores):
+    """isin con atajo para columnas categóricas: compara códigos enteros
+    en lugar de hashear cadena por cadena en cada fila"""
+    if isinstance(col.dtype, pd.CategoricalDtype):
+        codigos = col.cat.categories.get_indexer(valores)
+        # get_indexer devuelve -1 para valores inexistentes; excluirlos
+        # para no confundirlos con el código -1 de los NaN
+        return np.isin(col.cat.codes.to_numpy(), codigos[codigos >= 0])
+    return col.isin(valores).to_numpy()
+
+
 def filter_by_lugar(df, lugares):
     """Filtra DataFrame por lugares"""
     if not isinstance(lugares, list):
         lugares = [lugares]
-    return df[df['lugar'].isin(lugares)]
+    return df[_isin_rapido(df['lugar'], lugares)]
 
 
 def filter_by_categoria(df, categorias):
     """Filtra DataFrame por categorías"""
     if not isinstance(categorias, list):
         categorias = [categorias]
-    return df[df['categoria'].isin(categorias)]
+    return df[_isin_rapido(df['categoria'], categorias)]
 
 
 def get_price_stats(df, group_by=None):
@@ -81,17 +141,17 @@ def get_price_stats(df, group_by=None):
         group_by: 'lugar', 'categoria', 'fecha', o None
 
     Returns:
-        DataFrame con estadísticas
+        DataFrame con estadísticas (precisión completa; redondear al mostrar)
     """
     if group_by:
-        stats = df.groupby(group_by)['precio'].agg([
+        stats = df.groupby(group_by, observed=True)['precio'].agg([
             ('count', 'count'),
             ('mean', 'mean'),
             ('median', 'median'),
             ('min', 'min'),
             ('max', 'max'),
             ('std', 'std')
-        ]).round(2)
+        ])
     else:
         stats = df['precio'].describe()
 
@@ -107,51 +167,52 @@ def get_price_trends(df, freq='M'):
         freq: 'D' (diario), 'W' (semanal), 'M' (mensual), 'Y' (anual)
 
     Returns:
-        DataFrame con tendencias
+        DataFrame con tendencias (precisión completa; redondear al mostrar)
     """
-    df_trend = df.copy()
-    df_trend = df_trend.set_index('fecha')
+    # set_index ya devuelve un objeto nuevo y aquí no se muta nada:
+    # la copia previa solo duplicaba el DataFrame completo
+    df_trend = df.set_index('fecha', drop=False)
 
-    trends = df_trend.groupby(pd.Grouper(freq=freq))['precio'].agg([
+    trends = df_trend.groupby(pd.Grouper(freq=freq), sort=False)['precio'].agg([
         ('count', 'count'),
         ('mean', 'mean'),
         ('min', 'min'),
         ('max', 'max')
-    ]).round(2)
+    ])
 
     return trends
 
 
 def compare_places(df, lugares=None, top_n=10):
-    """Compara precios entre lugares"""
+    """Compara precios entre lugares (valores sin redondear)"""
     if lugares is None:
         # Tomar top N lugares por número de registros
         lugares = df['lugar'].value_counts().head(top_n).index.tolist()
 
-    comparison = df[df['lugar'].isin(lugares)].groupby('lugar')['precio'].agg([
+    comparison = df[df['lugar'].isin(lugares)].groupby('lugar', observed=True, sort=False)['precio'].agg([
         ('registros', 'count'),
         ('promedio', 'mean'),
         ('minimo', 'min'),
         ('maximo', 'max'),
         ('desv_std', 'std')
-    ]).round(2)
+    ])
 
     return comparison.sort_values('promedio', ascending=False)
 
 
 def compare_categories(df, categorias=None, top_n=10):
-    """Compara precios entre categorías"""
+    """Compara precios entre categorías (valores sin redondear)"""
     if categorias is None:
         # Tomar top N categorías por número de registros
         categorias = df['categoria'].value_counts().head(top_n).index.tolist()
 
-    comparison = df[df['categoria'].isin(categorias)].groupby('categoria')['precio'].agg([
+    comparison = df[df['categoria'].isin(categorias)].groupby('categoria', observed=True, sort=False)['precio'].agg([
         ('registros', 'count'),
         ('promedio', 'mean'),
         ('minimo', 'min'),
         ('maximo', 'max'),
         ('desv_std', 'std')
-    ]).round(2)
+    ])
 
     return comparison.sort_values('promedio', ascending=False)
 
@@ -165,7 +226,7 @@ def get_price_changes(df, freq='M'):
         freq: 'D', 'W', 'M', 'Y'
 
     Returns:
-        DataFrame con cambios absolutos y porcentuales
+        DataFrame con cambios absolutos y porcentuales (precisión completa)
     """
     trends = get_price_trends(df, freq)
 
@@ -173,7 +234,7 @@ def get_price_changes(df, freq='M'):
         'precio_promedio': trends['mean'],
         'cambio_absoluto': trends['mean'].diff(),
         'cambio_porcentual': trends['mean'].pct_change() * 100
-    }).round(2)
+    })
 
     return changes
 
@@ -190,24 +251,61 @@ def find_outliers(df, method='iqr', threshold=1.5):
     Returns:
         DataFrame con outliers
     """
+    arr = df['precio'].to_numpy()
+
     if method == 'iqr':
-        Q1 = df['precio'].quantile(0.25)
-        Q3 = df['precio'].quantile(0.75)
-        IQR = Q3 - Q1
-        lower_bound = Q1 - threshold * IQR
-        upper_bound = Q3 + threshold * IQR
-        outliers = df[(df['precio'] < lower_bound) | (df['precio'] > upper_bound)]
+        q1, q3 = np.percentile(arr, [25, 75])
+        iqr = q3 - q1
+        lower_bound = q1 - threshold * iqr
+        upper_bound = q3 + threshold * iqr
+        mask = (arr < lower_bound) | (arr > upper_bound)
 
     elif method == 'zscore':
-        from scipy import stats
-        z_scores = stats.zscore(df['precio'])
-        outliers = df[abs(z_scores) > threshold]
-
-    return outliers
+        z_scores = (arr - arr.mean()) / arr.std()
+        mask = np.abs(z_scores) > threshold
+
+    return df[mask]
+
+
+def _resumen_por_nivel(agg_lc, nivel, top_n=10):
+    """Deriva la tabla comparativa de un nivel ('lugar' o 'categoria') a
+    partir de la agregación lugar×categoría ya calculada, sin volver a
+    recorrer el DataFrame completo"""
+    g = agg_lc.groupby(level=nivel, observed=True)
+    registros = g['registros'].sum()
+    suma = g['suma'].sum()
+    suma_cuad = g['suma_cuad'].sum()
+    # Desviación estándar muestral reconstruida a partir de las sumas:
+    # var = (Σx² - (Σx)²/n) / (n - 1)
+    varianza = (suma_cuad - suma ** 2 / registros) / (registros - 1)
+    resumen = pd.DataFrame({
+        'registros': registros,
+        'promedio': suma / registros,
+        'minimo': g['minimo'].min(),
+        'maximo': g['maximo'].max(),
+        'desv_std': np.sqrt(varianza.clip(lower=0)),
+    })
+    top = resumen.nlargest(top_n, 'registros')
+    return top.sort_values('promedio', ascending=False)
 
 
 def export_summary(df, output_file='summary_report.txt'):
     """Genera y exporta un resumen completo"""
+    # Una sola pasada sobre 'precio' para estadísticas y límites de
+    # outliers, y una sola agregación lugar×categoría de la que se derivan
+    # ambas tablas comparativas
+    arr = df['precio'].to_numpy()
+    q1, mediana, q3 = np.percentile(arr, [25, 50, 75])
+    iqr = q3 - q1
+    mask_outliers = (arr < q1 - 1.5 * iqr) | (arr > q3 + 1.5 * iqr)
+    atipicos = arr[mask_outliers]
+
+    grupos = df.groupby(['lugar', 'categoria'], observed=True)
+    agg_lc = grupos['precio'].agg(
+        registros='count', suma='sum', minimo='min', maximo='max')
+    agg_lc['suma_cuad'] = (df['precio'] ** 2).groupby(
+        [df['lugar'], df['categoria']], observed=True).sum()
+
     with open(output_file, 'w', encoding='utf-8') as f:
         f.write("="*70 + "\n")
         f.write("REPORTE DE ANÁLISIS DE PRECIOS DE GANADO\n")
@@ -226,7 +324,16 @@ def export_summary(df, output_file='summary_report.txt'):
         # Estadísticas de precios
         f.write("2. ESTADÍSTICAS DE PRECIOS\n")
         f.write("-"*70 + "\n")
-        stats = df['precio'].describe()
+        stats = {
+            'count': arr.size,
+            'mean': arr.mean(),
+            'std': arr.std(ddof=1),
+            'min': arr.min(),
+            '25%': q1,
+            '50%': mediana,
+            '75%': q3,
+            'max': arr.max(),
+        }
         for stat, value in stats.items():
             f.write(f"{stat.capitalize()}: B/. {value:,.2f}\n")
         f.write("\n")
@@ -234,32 +341,31 @@ def export_summary(df, output_file='summary_report.txt'):
         # Top lugares
         f.write("3. TOP 10 LUGARES POR PRECIO PROMEDIO\n")
         f.write("-"*70 + "\n")
-        top_lugares = compare_places(df, top_n=10)
-        f.write(top_lugares.to_string())
+        top_lugares = _resumen_por_nivel(agg_lc, 'lugar')
+        f.write(top_lugares.to_string(float_format='{:,.2f}'.format))
         f.write("\n\n")
 
         # Top categorías
         f.write("4. TOP 10 CATEGORÍAS POR PRECIO PROMEDIO\n")
         f.write("-"*70 + "\n")
-        top_cats = compare_categories(df, top_n=10)
-        f.write(top_cats.to_string())
+        top_cats = _resumen_por_nivel(agg_lc, 'categoria')
+        f.write(top_cats.to_string(float_format='{:,.2f}'.format))
         f.write("\n\n")
 
         # Tendencias mensuales
         f.write("5. TENDENCIAS MENSUALES (ÚLTIMOS 12 MESES)\n")
         f.write("-"*70 + "\n")
         trends = get_price_trends(df, freq='M').tail(12)
-        f.write(trends.to_string())
+        f.write(trends.to_string(float_format='{:,.2f}'.format))
         f.write("\n\n")
 
         # Outliers
         f.write("6. VALORES ATÍPICOS DETECTADOS\n")
         f.write("-"*70 + "\n")
-        outliers = find_outliers(df)
-        f.write(f"Total de outliers: {len(outliers)}\n")
-        if len(outliers) > 0:
-            f.write(f"Precio mínimo atípico: B/. {outliers['precio'].min():,.2f}\n")
-            f.write(f"Precio máximo atípico: B/. {outliers['precio'].max():,.2f}\n")
+        f.write(f"Total de outliers: {atipicos.size}\n")
+        if atipicos.size > 0:
+            f.write(f"Precio mínimo atípico: B/. {atipicos.min():,.2f}\n")
+            f.write(f"Precio máximo atípico: B/. {atipicos.max():,.2f}\n")
         f.write("\n")
 
         f.write("="*70 + "\n")
@@ -288,27 +394,31 @@ def query_data(df, query_dict):
     Returns:
         DataFrame filtrado
     """
-    result = df.copy()
+    # Acumular todos los filtros en una sola máscara booleana y cortar el
+    # DataFrame una única vez al final, en lugar de copiarlo filtro a filtro
+    mask = np.ones(len(df), dtype=bool)
 
     if 'fecha_inicio' in query_dict:
-        result = filter_by_date(result, start_date=query_dict['fecha_inicio'])
+        mask &= df['fecha'].to_numpy() >= pd.to_datetime(query_dict['fecha_inicio']).to_datetime64()
 
     if 'fecha_fin' in query_dict:
-        result = filter_by_date(result, end_date=query_dict['fecha_fin'])
+        mask &= df['fecha'].to_numpy() <= pd.to_datetime(query_dict['fecha_fin']).to_datetime64()
 
     if 'lugares' in query_dict:
-        result = filter_by_lugar(result, query_dict['lugares'])
+        lugares = query_dict['lugares']
+        mask &= _isin_rapido(df['lugar'], lugares if isinstance(lugares, list) else [lugares])
 
     if 'categorias' in query_dict:
-        result = filter_by_categoria(result, query_dict['categorias'])
+        categorias = query_dict['categorias']
+        mask &= _isin_rapido(df['categoria'], categorias if isinstance(categorias, list) else [categorias])
 
     if 'precio_min' in query_dict:
-        result = result[result['precio'] >= query_dict['precio_min']]
+        mask &= df['precio'].to_numpy() >= query_dict['precio_min']
 
     if 'precio_max' in query_dict:
-        result = result[result['precio'] <= query_dict['precio_max']]
+        mask &= df['precio'].to_numpy() <= query_dict['precio_max']
 
-    return result
+    return df[mask]
 
 
 # Ejemplo de uso
@@ -316,6 +426,7 @@ if __name__ == "__main__":
     print("Utilidades para análisis de precios de ganado")
     print("\nFunciones disponibles:")
     print("  - load_data(): Cargar datos")
+    print("  - optimize_dtypes(): Compactar dtypes numéricos")
     print("  - filter_by_date(): Filtrar por fechas")
     print("  - filter_by_lugar(): Filtrar por lugares")
     print("  - filter_by_categoria(): Filtrar por categorías")